@@ -18,6 +18,7 @@ BDC_STAC_API_VERSION = "1.0.0-beta.2"
 BDC_STAC_BASE_URL = os.getenv("BDC_STAC_BASE_URL", "http://localhost:5000")
 BDC_STAC_FILE_ROOT = os.getenv("BDC_STAC_FILE_ROOT", "http://localhost:5001")
 BDC_STAC_MAX_LIMIT = int(os.getenv("BDC_STAC_MAX_LIMIT", "1000"))
+BDC_STAC_CACHE_TTL = int(os.getenv("BDC_STAC_CACHE_TTL", "300"))
 BDC_STAC_TITLE = os.getenv("BDC_STAC_TITLE", "Brazil Data Cube Catalog")
 BDC_STAC_ID = os.getenv("BDC_STAC_ID", "bdc")
 BDC_STAC_ASSETS_ARGS = os.getenv("BDC_STAC_ASSETS_ARGS", "access_token")
@@ -1,16 +1,18 @@
 """Data module."""
-import json
 import warnings
-from datetime import datetime as dt
-from functools import lru_cache
+from functools import lru_cache, wraps
+from threading import Lock
 
 from bdc_catalog.models import Band, Collection, CompositeFunction, GridRefSys, Item, Tile, Timeline
+from cachetools import TTLCache, cached
 from flask import abort
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import Pagination, SQLAlchemy
 from geoalchemy2.functions import GenericFunction
-from sqlalchemy import Float, and_, cast, exc, func, or_
+from sqlalchemy import Float, and_, bindparam, cast, exc, false, func, or_, text, tuple_
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.ext import baked
 
-from .config import BDC_STAC_API_VERSION, BDC_STAC_BASE_URL, BDC_STAC_FILE_ROOT, BDC_STAC_MAX_LIMIT
+from .config import BDC_STAC_API_VERSION, BDC_STAC_BASE_URL, BDC_STAC_CACHE_TTL, BDC_STAC_FILE_ROOT, BDC_STAC_MAX_LIMIT
 
 with warnings.catch_warnings():
     warnings.simplefilter("ignore", category=exc.SAWarning)
@@ -20,8 +22,87 @@ db = SQLAlchemy()
 
 session = db.create_scoped_session({"autocommit": True})
 
+bakery = baked.bakery()
+
+cache_lock = Lock()
+eo_cache = TTLCache(maxsize=512, ttl=BDC_STAC_CACHE_TTL)
+crs_cache = TTLCache(maxsize=512, ttl=BDC_STAC_CACHE_TTL)
+tiles_cache = TTLCache(maxsize=512, ttl=BDC_STAC_CACHE_TTL)
+timeline_cache = TTLCache(maxsize=512, ttl=BDC_STAC_CACHE_TTL)
+quicklook_cache = TTLCache(maxsize=512, ttl=BDC_STAC_CACHE_TTL)
+
 DATETIME_RFC339 = "%Y-%m-%dT%H:%M:%SZ"
 
+ITEM_SRID = Item.geom.type.srid
+
+QUICKLOOK_QUERY = text(
+    "SELECT q.collection_id, array[r.name, g.name, b.name] as quicklooks "
+    "FROM bdc.quicklook q "
+    "INNER JOIN bdc.bands r ON q.red = r.id "
+    "INNER JOIN bdc.bands g ON q.green = g.id "
+    "INNER JOIN bdc.bands b ON q.blue = b.id "
+    "WHERE q.collection_id IN :collection_ids"
+).bindparams(bindparam("collection_ids", expanding=True))
+
+quicklook_compiled_cache = dict()
+
+
+@lru_cache(maxsize=1024)
+def _role_ids(roles):
+    """Parse the collection identifiers granted by a set of user roles.
+
+    :param roles: user roles formatted as ``<collection_id>:<name>``
+    :type roles: tuple
+    :return: collection identifiers
+    :rtype: tuple
+    """
+    return tuple(int(r.split(":", 1)[0]) for r in roles)
+
+
+def _collection_filter(collection_ids):
+    """Build a filter that matches collections by their STAC identifier (``<name>-<version>``).
+
+    The name and version columns are compared directly so that the unique index on them can be used,
+    instead of concatenating both columns for every row.
+
+    :param collection_ids: collection identifiers
+    :type collection_ids: list
+    :return: SQLAlchemy filter
+    """
+    version_type = Collection.__table__.c.version.type.python_type
+
+    keys = list()
+    for collection_id in collection_ids:
+        name, _, version = collection_id.rpartition("-")
+        try:
+            value = version_type(version)
+        except ValueError:
+            continue
+
+        # Only canonical versions match, otherwise ids like "<name>-01" would alias "<name>-1"
+        if str(value) == version:
+            keys.append((name, value))
+
+    if not keys:
+        return false()
+    if len(keys) == 1:
+        return and_(Collection.name == keys[0][0], Collection.version == keys[0][1])
+    return tuple_(Collection.name, Collection.version).in_(bindparam("collection_keys", keys, expanding=True))
+
+
+@lru_cache(maxsize=8192)
+def _format_datetime(value):
+    """Format a datetime as RFC 3339.
+
+    Items of the same tile or period share their timestamps, so the formatted values are cached.
+
+    :param value: date and time
+    :type value: datetime.datetime
+    :return: RFC 3339 formatted datetime
+    :rtype: str
+    """
+    return value.strftime(DATETIME_RFC339)
+
 
 class ST_Extent(GenericFunction):
     """Postgis ST_Extent function."""
@@ -30,6 +111,49 @@ class ST_Extent(GenericFunction):
     type = None
 
 
+class ItemPagination(Pagination):
+    """Pagination of items streamed from the database.
+
+    The total is derived from the page rows when they do not fill the page, as the last page does.
+    Otherwise it is counted with a separate query, only when it is requested.
+    """
+
+    def __init__(self, query, page, per_page, items):
+        """Initialize the pagination.
+
+        :param query: items query, without limit and offset
+        :param page: page number
+        :type page: int
+        :param per_page: page size
+        :type per_page: int
+        :param items: page rows
+        :type items: iterable
+        """
+        self._returned = 0
+        self._exhausted = False
+        super(ItemPagination, self).__init__(query, page, per_page, None, self._stream(items))
+
+    def _stream(self, items):
+        for item in items:
+            self._returned += 1
+            yield item
+        self._exhausted = True
+
+    @property
+    def total(self):
+        """:return: number of items matched by the query."""
+        if self._total is None:
+            if self._exhausted and self._returned < self.per_page and (self._returned > 0 or self.page == 1):
+                self._total = (self.page - 1) * self.per_page + self._returned
+            else:
+                self._total = self.query.order_by(None).count()
+        return self._total
+
+    @total.setter
+    def total(self, value):
+        self._total = value
+
+
 def get_collection_items(
     collection_id=None,
     roles=None,
@@ -71,8 +195,8 @@ def get_collection_items(
     :type page: int, optional
     :param limit: The maximum number of results to return (page size), defaults to 10
     :type limit: int, optional
-    :return: list of collectio items
-    :rtype: list
+    :return: pagination whose items are streamed from the database
+    :rtype: ItemPagination
     """
     columns = [
         func.concat(Collection.name, "-", Collection.version).label("collection"),
@@ -88,33 +212,38 @@ def get_collection_items(
         Item.created,
         Item.updated,
         cast(Item.cloud_cover, Float).label("cloud_cover"),
-        func.ST_AsGeoJSON(Item.geom).label("geom"),
-        func.Box2D(Item.geom).label("bbox"),
+        cast(func.ST_AsGeoJSON(Item.geom), JSON).label("geom"),
+        func.ST_XMin(Item.geom).label("xmin"),
+        func.ST_YMin(Item.geom).label("ymin"),
+        func.ST_XMax(Item.geom).label("xmax"),
+        func.ST_YMax(Item.geom).label("ymax"),
         Tile.name.label("tile"),
     ]
 
-    if roles is None:
-        roles = []
+    params = {"role_ids": _role_ids(tuple(roles or ()))}
 
     where = [
         Collection.id == Item.collection_id,
-        or_(Collection.is_public.is_(True), Collection.id.in_([int(r.split(":")[0]) for r in roles])),
+        or_(Collection.is_public.is_(True), Collection.id.in_(bindparam("role_ids", expanding=True))),
     ]
 
     if ids is not None:
         if isinstance(ids, str):
             ids = ids.split(",")
-        where += [Item.name.in_(ids)]
+        where += [Item.name.in_(bindparam("ids", expanding=True))]
+        params["ids"] = list(ids)
+    elif item_id is not None:
+        # A single item is requested: the remaining filters would not narrow the result any further
+        where += [Item.name == item_id]
+        if collection_id is not None:
+            where += [_collection_filter([collection_id])]
     else:
         if collection_id is not None:
-            where += [func.concat(Collection.name, "-", Collection.version) == collection_id]
+            where += [_collection_filter([collection_id])]
         elif collections is not None:
             if isinstance(collections, str):
                 collections = collections.split(",")
-            where += [func.concat(Collection.name, "-", Collection.version).in_(collections)]
-
-        if item_id is not None:
-            where += [Item.name.like(item_id)]
+            where += [_collection_filter(collections)]
 
         if query:
             filters = create_query_filter(query)
@@ -122,61 +251,112 @@ def get_collection_items(
                 where += filters
 
         if intersects is not None:
-            where += [func.ST_Intersects(func.ST_GeomFromGeoJSON(str(intersects)), Item.geom)]
+            geom = func.ST_GeomFromGeoJSON(str(intersects))
+            where += [Item.geom.op("&&")(geom), func.ST_Intersects(geom, Item.geom)]
         elif bbox is not None:
             try:
-                if isinstance(bbox, str):
-                    bbox = bbox.split(",")
-
-                bbox = [float(x) for x in bbox]
-
-                if bbox[0] == bbox[2] or bbox[1] == bbox[3]:
-                    raise InvalidBoundingBoxError("")
-
-                where += [
-                    func.ST_Intersects(
-                        func.ST_MakeEnvelope(
-                            bbox[0],
-                            bbox[1],
-                            bbox[2],
-                            bbox[3],
-                            func.ST_SRID(Item.geom),
-                        ),
-                        Item.geom,
-                    )
-                ]
-            except (ValueError, InvalidBoundingBoxError) as e:
-                abort(400, f"'{bbox}' is not a valid bbox.")
+                bbox = parse_bbox(bbox)
+            except InvalidBoundingBoxError as e:
+                abort(400, e.description)
+
+            envelope = func.ST_MakeEnvelope(
+                bbox[0],
+                bbox[1],
+                bbox[2],
+                bbox[3],
+                ITEM_SRID,
+            )
+            where += [Item.geom.op("&&")(envelope), func.ST_Intersects(envelope, Item.geom)]
 
         if datetime is not None:
+            # Since start_date <= end_date, an item intersects [time_start, time_end] if and only if
+            # start_date <= time_end and end_date >= time_start
             date_filter = None
             if "/" in datetime:
                 matches_open = ("..", "")
                 time_start, time_end = datetime.split("/")
                 if time_start in matches_open:  # open start
-                    date_filter = [or_(Item.start_date <= time_end, Item.end_date <= time_end)]
+                    date_filter = [Item.start_date <= time_end]
                 elif time_end in matches_open:  # open end
-                    date_filter = [or_(Item.start_date >= time_start, Item.end_date >= time_start)]
+                    date_filter = [Item.end_date >= time_start]
                 else:  # closed range
-                    date_filter = [
-                        or_(
-                            and_(Item.start_date >= time_start, Item.start_date <= time_end),
-                            and_(Item.end_date >= time_start, Item.end_date <= time_end),
-                            and_(Item.start_date < time_start, Item.end_date > time_end),
-                        )
-                    ]
+                    date_filter = [Item.start_date <= time_end, Item.end_date >= time_start]
             else:
                 date_filter = [and_(Item.start_date <= datetime, Item.end_date >= datetime)]
             where += date_filter
     outer = [Item.tile_id == Tile.id]
-    query = session.query(*columns).outerjoin(Tile, *outer).filter(*where).order_by(Item.start_date.desc(), Item.id)
+    query = (
+        session.query(*columns)
+        .outerjoin(Tile, *outer)
+        .filter(*where)
+        .order_by(Item.start_date.desc(), Item.id)
+        .params(**params)
+    )
 
-    result = query.paginate(page=int(page), per_page=int(limit), error_out=False, max_per_page=BDC_STAC_MAX_LIMIT)
+    page = max(int(page), 1)
+    per_page = min(int(limit), BDC_STAC_MAX_LIMIT)
+    if per_page < 0:
+        per_page = 20
 
-    return result
+    # Stream the page rows through a server-side cursor instead of loading them all at once
+    items = query.limit(per_page).offset((page - 1) * per_page).yield_per(500)
+
+    return ItemPagination(query, page, per_page, items)
+
+
+def cached_by_collection(cache, default=None):
+    """Cache, for each collection, the result of a lookup made for several collections at once.
+
+    Only the collections missing from the cache are passed to the decorated function.
+
+    :param cache: cache used to store the values by collection identifier
+    :type cache: cachetools.Cache
+    :param default: value cached for the collections absent from the lookup result, defaults to None
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(collection_ids):
+            result, missing = dict(), list()
+            not_cached = object()
+
+            with cache_lock:
+                for collection_id in collection_ids:
+                    value = cache.get(collection_id, not_cached)
+                    if value is not_cached:
+                        missing.append(collection_id)
+                    else:
+                        result[collection_id] = value
+
+            if missing:
+                values = f(missing)
+
+                with cache_lock:
+                    for collection_id in missing:
+                        result[collection_id] = cache[collection_id] = values.get(collection_id, default)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_collection(collection_id):
+    """Remove the cached metadata of a collection.
+
+    Must be called when the items, bands or grid of a collection change.
+
+    :param collection_id: collection identifier
+    :type collection_id: int
+    """
+    collection_id = int(collection_id)
+
+    with cache_lock:
+        for cache in (eo_cache, crs_cache, tiles_cache, timeline_cache, quicklook_cache):
+            cache.pop(collection_id, None)
 
 
-@lru_cache()
 def get_collection_eo(collection_id):
     """Get Collection Eletro-Optical properties.
 
@@ -185,8 +365,23 @@ def get_collection_eo(collection_id):
     Returns:
         eo_gsd, eo_bands (tuple(float, dict)):
     """
-    bands = (
-        session.query(
+    collection_id = int(collection_id)
+
+    return get_eo_by_collection([collection_id])[collection_id]
+
+
+@cached_by_collection(eo_cache)
+def get_eo_by_collection(collection_ids):
+    """Get the Eletro-Optical properties of several collections using a single query.
+
+    Args:
+        collection_ids (list): collection identifiers
+    Returns:
+        dict: eo_gsd and eo_bands keyed by collection identifier
+    """
+    baked_query = bakery(
+        lambda session: session.query(
+            Band.collection_id,
             Band.name,
             Band.common_name,
             Band.description,
@@ -199,14 +394,16 @@ def get_collection_eo(collection_id):
             cast(Band.center_wavelength, Float).label("center_wavelength"),
             cast(Band.full_width_half_max, Float).label("full_width_half_max"),
         )
-        .filter(Band.collection_id == collection_id)
-        .all()
     )
-    eo_bands = list()
-    eo_gsd = 0.0
+    baked_query += lambda q: q.filter(Band.collection_id.in_(bindparam("collection_ids", expanding=True)))
+
+    bands = baked_query(session()).params(collection_ids=list(collection_ids)).all()
+
+    result = {collection_id: {"eo:gsd": 0.0, "eo:bands": list()} for collection_id in collection_ids}
 
     for band in bands:
-        eo_bands.append(
+        collection_eo = result[band.collection_id]
+        collection_eo["eo:bands"].append(
             dict(
                 name=band.name,
                 common_name=band.common_name,
@@ -220,10 +417,10 @@ def get_collection_eo(collection_id):
                 data_type=band.data_type,
             )
         )
-        if band.gsd > eo_gsd:
-            eo_gsd = band.gsd
+        if band.gsd > collection_eo["eo:gsd"]:
+            collection_eo["eo:gsd"] = band.gsd
 
-    return {"eo:gsd": eo_gsd, "eo:bands": eo_bands}
+    return result
 
 
 def get_collection_bands(collection_id):
@@ -234,8 +431,8 @@ def get_collection_bands(collection_id):
     :return: dict of bands for the collection
     :rtype: dict
     """
-    bands = (
-        session.query(
+    baked_query = bakery(
+        lambda session: session.query(
             Band.name,
             Band.common_name,
             cast(Band.min, Float).label("min"),
@@ -244,9 +441,10 @@ def get_collection_bands(collection_id):
             cast(Band.scale, Float).label("scale"),
             Band.data_type,
         )
-        .filter(Band.collection_id == collection_id)
-        .all()
     )
+    baked_query += lambda q: q.filter(Band.collection_id == bindparam("collection_id"))
+
+    bands = baked_query(session()).params(collection_id=collection_id).all()
     bands_json = dict()
 
     for b in bands:
@@ -262,20 +460,39 @@ def get_collection_tiles(collection_id):
 
     :param collection_id: collection identifier
     :type collection_id: str
-    :return: list of tiles for the collection
-    :rtype: list
+    :return: tiles of the collection
+    :rtype: tuple
     """
-    tiles = (
-        session.query(Tile.name)
-        .filter(Item.collection_id == collection_id, Item.tile_id == Tile.id)
-        .group_by(Tile.name)
-        .all()
+    collection_id = int(collection_id)
+
+    return get_tiles_by_collection([collection_id])[collection_id]
+
+
+@cached_by_collection(tiles_cache, default=tuple())
+def get_tiles_by_collection(collection_ids):
+    """Retrive the tiles of several collections using a single query.
+
+    :param collection_ids: collection identifiers
+    :type collection_ids: list
+    :return: tuple of tiles keyed by collection identifier
+    :rtype: dict
+    """
+    baked_query = bakery(lambda session: session.query(Item.collection_id, Tile.name))
+    baked_query += lambda q: q.filter(
+        Item.collection_id.in_(bindparam("collection_ids", expanding=True)), Item.tile_id == Tile.id
     )
+    baked_query += lambda q: q.group_by(Item.collection_id, Tile.name)
+
+    tiles = baked_query(session()).params(collection_ids=list(collection_ids)).all()
 
-    return [t.name for t in tiles]
+    result = dict()
+    for t in tiles:
+        result.setdefault(t.collection_id, []).append(t.name)
 
+    return {collection_id: tuple(names) for collection_id, names in result.items()}
 
-@lru_cache()
+
+@cached(crs_cache, key=lambda collection_id: int(collection_id), lock=cache_lock)
 def get_collection_crs(collection_id):
     """Retrive the CRS for a given collection.
 
@@ -284,13 +501,11 @@ def get_collection_crs(collection_id):
     :return: CRS for the collection
     :rtype: str
     """
-    grs = (
-        session.query(GridRefSys)
-        .filter(Collection.id == collection_id, Collection.grid_ref_sys_id == GridRefSys.id)
-        .first()
-    )
+    baked_query = bakery(lambda session: session.query(GridRefSys.crs))
+    baked_query += lambda q: q.join(Collection, Collection.grid_ref_sys_id == GridRefSys.id)
+    baked_query += lambda q: q.filter(Collection.id == bindparam("collection_id"))
 
-    return grs.crs
+    return baked_query(session()).params(collection_id=collection_id).scalar()
 
 
 def get_collection_timeline(collection_id):
@@ -298,17 +513,34 @@ def get_collection_timeline(collection_id):
 
     :param collection_id: collection identifier
     :type collection_id: str
-    :return: list of dates for the collection
-    :rtype: list
+    :return: dates of the collection
+    :rtype: tuple
     """
-    timeline = (
-        session.query(Timeline.time_inst)
-        .filter(Timeline.collection_id == collection_id)
-        .order_by(Timeline.time_inst.asc())
-        .all()
-    )
+    collection_id = int(collection_id)
 
-    return [dt.fromisoformat(str(t.time_inst)).strftime("%Y-%m-%d") for t in timeline]
+    return get_timeline_by_collection([collection_id])[collection_id]
+
+
+@cached_by_collection(timeline_cache, default=tuple())
+def get_timeline_by_collection(collection_ids):
+    """Retrive the timeline of several collections using a single query.
+
+    :param collection_ids: collection identifiers
+    :type collection_ids: list
+    :return: tuple of dates keyed by collection identifier
+    :rtype: dict
+    """
+    baked_query = bakery(lambda session: session.query(Timeline.collection_id, Timeline.time_inst))
+    baked_query += lambda q: q.filter(Timeline.collection_id.in_(bindparam("collection_ids", expanding=True)))
+    baked_query += lambda q: q.order_by(Timeline.collection_id, Timeline.time_inst.asc())
+
+    timeline = baked_query(session()).params(collection_ids=list(collection_ids)).all()
+
+    result = dict()
+    for t in timeline:
+        result.setdefault(t.collection_id, []).append(t.time_inst.strftime("%Y-%m-%d"))
+
+    return {collection_id: tuple(dates) for collection_id, dates in result.items()}
 
 
 def get_collection_extent(collection_id):
@@ -319,17 +551,34 @@ def get_collection_extent(collection_id):
     :return: list of coordinates for the collection extent
     :rtype: list
     """
-    extent = (
-        session.query(func.ST_Extent(Item.geom).label("bbox"))
-        .filter(Collection.id == Item.collection_id, Collection.id == collection_id)
-        .first()
+    collection_id = int(collection_id)
+
+    return get_extent_by_collection([collection_id]).get(collection_id, [])
+
+
+def get_extent_by_collection(collection_ids):
+    """Retrive the extent of several collections using a single query.
+
+    :param collection_ids: collection identifiers
+    :type collection_ids: list
+    :return: list of coordinates keyed by collection identifier
+    :rtype: dict
+    """
+    baked_query = bakery(
+        lambda session: session.query(
+            Item.collection_id,
+            func.ST_XMin(func.ST_Extent(Item.geom)).label("xmin"),
+            func.ST_YMin(func.ST_Extent(Item.geom)).label("ymin"),
+            func.ST_XMax(func.ST_Extent(Item.geom)).label("xmax"),
+            func.ST_YMax(func.ST_Extent(Item.geom)).label("ymax"),
+        )
     )
+    baked_query += lambda q: q.filter(Item.collection_id.in_(bindparam("collection_ids", expanding=True)))
+    baked_query += lambda q: q.group_by(Item.collection_id)
 
-    bbox = list()
-    if extent.bbox:
-        bbox = extent.bbox[extent.bbox.find("(") + 1 : extent.bbox.find(")")].replace(" ", ",")
-        bbox = [float(coord) for coord in bbox.split(",")]
-    return bbox
+    extents = baked_query(session()).params(collection_ids=list(collection_ids)).all()
+
+    return {e.collection_id: [e.xmin, e.ymin, e.xmax, e.ymax] if e.xmin is not None else list() for e in extents}
 
 
 def get_collection_quicklook(collection_id):
@@ -340,18 +589,29 @@ def get_collection_quicklook(collection_id):
     :return: list of bands
     :rtype: list.
     """
-    quicklook_bands = session.execute(
-        "SELECT  array[r.name, g.name, b.name] as quicklooks "
-        "FROM bdc.quicklook q "
-        "INNER JOIN bdc.bands r ON q.red = r.id "
-        "INNER JOIN bdc.bands g ON q.green = g.id "
-        "INNER JOIN bdc.bands b ON q.blue = b.id "
-        "INNER JOIN bdc.collections c ON q.collection_id = c.id "
-        "WHERE c.id = :collection_id",
-        {"collection_id": collection_id},
-    ).fetchone()
+    collection_id = int(collection_id)
+
+    return get_quicklook_by_collection([collection_id])[collection_id]
 
-    return quicklook_bands["quicklooks"] if quicklook_bands else None
+
+@cached_by_collection(quicklook_cache)
+def get_quicklook_by_collection(collection_ids):
+    """Retrive the quicklook bands of several collections using a single query.
+
+    :param collection_ids: collection identifiers
+    :type collection_ids: list
+    :return: list of bands keyed by collection identifier
+    :rtype: dict
+    """
+    # SQLAlchemy reads the compiled cache from the connection options, so it is enabled only for this statement
+    with db.engine.connect() as connection:
+        quicklook_bands = (
+            connection.execution_options(compiled_cache=quicklook_compiled_cache)
+            .execute(QUICKLOOK_QUERY, collection_ids=list(collection_ids))
+            .fetchall()
+        )
+
+    return {q["collection_id"]: tuple(q["quicklooks"]) for q in quicklook_bands}
 
 
 def get_collections(collection_id=None, roles=None, assets_kwargs=None):
@@ -376,29 +636,48 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
         Collection.temporal_composition_schema,
         CompositeFunction.name.label("composite_function"),
         GridRefSys.name.label("grid_ref_sys"),
+        GridRefSys.crs,
     ]
 
-    if roles is None:
-        roles = []
+    role_ids = _role_ids(tuple(roles or ()))
 
     where = [
-        or_(Collection.is_public.is_(True), Collection.id.in_([int(r.split(":")[0]) for r in roles])),
+        or_(Collection.is_public.is_(True), Collection.id.in_(bindparam("role_ids", expanding=True))),
     ]
 
     if collection_id:
-        where.append(func.concat(Collection.name, "-", Collection.version) == collection_id)
+        where.append(_collection_filter([collection_id]))
 
     result = (
         session.query(*columns)
         .outerjoin(CompositeFunction, Collection.composite_function_id == CompositeFunction.id)
         .outerjoin(GridRefSys, Collection.grid_ref_sys_id == GridRefSys.id)
         .filter(*where)
+        .params(role_ids=role_ids)
         .all()
     )
 
     collections = list()
 
+    if not result:
+        return collections
+
+    # Fetch the properties of every collection at once instead of querying them one by one
+    collection_ids = [r.id for r in result]
+    cube_ids = [r.id for r in result if r.collection_type == "cube"]
+
+    tiles = get_tiles_by_collection(collection_ids)
+    extents = get_extent_by_collection(collection_ids)
+    quicklooks = get_quicklook_by_collection(collection_ids)
+    eo = get_eo_by_collection(collection_ids)
+    timelines = get_timeline_by_collection(cube_ids) if cube_ids else dict()
+
     for r in result:
+        meta = r.meta
+        collection_eo = eo[r.id]
+        quicklook = quicklooks[r.id]
+        properties = dict(collection_eo)
+
         collection = {
             "id": r.name,
             "stac_version": BDC_STAC_API_VERSION,
@@ -407,20 +686,17 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
             "version": r.version,
             "deprecated": False,
             "description": r.description,
-            "properties": {},
+            "properties": properties,
             "bdc:grs": r.grid_ref_sys,
-            "bdc:tiles": get_collection_tiles(r.id),
+            "bdc:tiles": tiles[r.id],
             "bdc:composite_function": r.composite_function,
             "bdc:type": r.collection_type,
         }
 
-        if r.meta and ("rightsList" in r.meta) and (len(r.meta["rightsList"]) > 0):
+        rights_list = meta.get("rightsList") if meta else None
+        collection["license"] = rights_list[0].get("rights", "") if rights_list else ""
 
-            collection["license"] = r.meta["rightsList"][0].get("rights", "")
-        else:
-            collection["license"] = ""
-
-        bbox = get_collection_extent(r.id)
+        bbox = extents.get(r.id, [])
 
         start, end = None, None
 
@@ -434,45 +710,44 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
             "temporal": {"interval": [[start, end]]},
         }
 
-        quicklooks = get_collection_quicklook(r.id)
-
-        if quicklooks is not None:
-            collection["bdc:bands_quicklook"] = quicklooks
+        if quicklook is not None:
+            collection["bdc:bands_quicklook"] = quicklook
 
-        collection_eo = get_collection_eo(r.id)
-        collection["properties"].update(collection_eo)
+        if meta:
+            platform = meta.get("platform")
+            if platform is not None:
+                properties["instruments"] = platform["instruments"]
+                properties["platform"] = platform["code"]
 
-        if r.meta:
-            if "platform" in r.meta:
-                collection["properties"]["instruments"] = r.meta["platform"]["instruments"]
-                collection["properties"]["platform"] = r.meta["platform"]["code"]
-
-                r.meta.pop("platform")  # platform info is displayed on properties
-            collection["bdc:metadata"] = r.meta
+                # platform info is displayed on properties
+                meta = {k: v for k, v in meta.items() if k != "platform"}
+            collection["bdc:metadata"] = meta
 
         if r.collection_type == "cube":
-            proj4text = get_collection_crs(r.id)
+            proj4text = r.crs
 
             datacube = {
                 "x": dict(type="spatial", axis="x", extent=[bbox[0], bbox[2]], reference_system=proj4text),
                 "y": dict(type="spatial", axis="y", extent=[bbox[1], bbox[3]], reference_system=proj4text),
-                "temporal": dict(type="temporal", extent=[start, end], values=get_collection_timeline(r.id)),
+                "temporal": dict(type="temporal", extent=[start, end], values=timelines[r.id]),
                 "bands": dict(type="bands", values=[band["name"] for band in collection_eo["eo:bands"]]),
             }
 
             collection["cube:dimensions"] = datacube
-            collection["bdc:crs"] = get_collection_crs(r.id)
+            collection["bdc:crs"] = proj4text
             collection["bdc:temporal_composition"] = r.temporal_composition_schema
 
+        collection_href = f"{BDC_STAC_BASE_URL}/collections/{r.name}"
+
         collection["links"] = [
             {
-                "href": f"{BDC_STAC_BASE_URL}/collections/{r.name}{assets_kwargs}",
+                "href": f"{collection_href}{assets_kwargs}",
                 "rel": "self",
                 "type": "application/json",
                 "title": "Link to this document",
             },
             {
-                "href": f"{BDC_STAC_BASE_URL}/collections/{r.name}/items{assets_kwargs}",
+                "href": f"{collection_href}/items{assets_kwargs}",
                 "rel": "items",
                 "type": "application/json",
                 "title": f"Items of the collection {r.name}",
@@ -502,8 +777,7 @@ def get_catalog(roles=None):
     :return: a list of available collections
     :rtype: list
     """
-    if not roles:
-        roles = []
+    role_ids = _role_ids(tuple(roles or ()))
 
     collections = (
         session.query(
@@ -514,9 +788,10 @@ def get_catalog(roles=None):
         .filter(
             or_(
                 Collection.is_public.is_(True),
-                Collection.id.in_([int(r.split(":")[0]) for r in roles]),
+                Collection.id.in_(bindparam("role_ids", expanding=True)),
             )
         )
+        .params(role_ids=role_ids)
         .all()
     )
     return collections
@@ -526,64 +801,71 @@ def make_geojson(items, assets_kwargs=""):
     """Generate a list of STAC Items from a list of collection items.
 
     :param items: collection items to be formated as GeoJSON Features
-    :type items: list
+    :type items: iterable
     :param links: links for STAC navigation
     :type links: list
     :return: GeoJSON Features.
-    :rtype: list
+    :rtype: generator
     """
-    features = list()
+    assets_kwargs = assets_kwargs or ""
+
+    band_index_by_collection = dict()
+
+    # The root link is the same for every feature, so a single dict is shared among them
+    root_link = {"href": f"{BDC_STAC_BASE_URL}/", "rel": "root"}
 
     for i in items:
+        collection_href = f"{BDC_STAC_BASE_URL}/collections/{i.collection}"
+        parent_href = f"{collection_href}{assets_kwargs}"
+
         feature = {
             "type": "Feature",
             "id": i.item,
             "collection": i.collection,
             "stac_version": BDC_STAC_API_VERSION,
             "stac_extensions": ["bdc", "checksum", "commons", "eo"],
-            "geometry": json.loads(i.geom),
+            "geometry": i.geom,
             "links": [
-                {
-                    "href": f"{BDC_STAC_BASE_URL}/collections/{i.collection}/items/{i.item}{assets_kwargs}",
-                    "rel": "self",
-                },
-                {"href": f"{BDC_STAC_BASE_URL}/collections/{i.collection}{assets_kwargs}", "rel": "parent"},
-                {"href": f"{BDC_STAC_BASE_URL}/collections/{i.collection}{assets_kwargs}", "rel": "collection"},
-                {"href": f"{BDC_STAC_BASE_URL}/", "rel": "root"},
+                {"href": f"{collection_href}/items/{i.item}{assets_kwargs}", "rel": "self"},
+                {"href": parent_href, "rel": "parent"},
+                {"href": parent_href, "rel": "collection"},
+                root_link,
             ],
         }
 
-        bbox = list()
-        if i.bbox:
-            bbox = i.bbox[i.bbox.find("(") + 1 : i.bbox.find(")")].replace(" ", ",")
-            bbox = [float(coord) for coord in bbox.split(",")]
-        feature["bbox"] = bbox
+        feature["bbox"] = [i.xmin, i.ymin, i.xmax, i.ymax] if i.xmin is not None else list()
 
-        bands = get_collection_eo(i.collection_id)
+        # Items are streamed, so the bands are looked up the first time each collection shows up in the page
+        band_index = band_index_by_collection.get(i.collection_id)
+        if band_index is None:
+            bands = get_collection_eo(i.collection_id)
+            band_index = {band["name"]: band for band in bands["eo:bands"]}
+            band_index_by_collection[i.collection_id] = band_index
+
+        start = _format_datetime(i.start)
 
         properties = {
             "bdc:tiles": [i.tile],
-            "datetime": i.start.strftime(DATETIME_RFC339),
-            "start_datetime": i.start.strftime(DATETIME_RFC339),
-            "end_datetime": i.end.strftime(DATETIME_RFC339),
-            "created": i.created.strftime(DATETIME_RFC339),
-            "updated": i.updated.strftime(DATETIME_RFC339),
+            "datetime": start,
+            "start_datetime": start,
+            "end_datetime": _format_datetime(i.end),
+            "created": _format_datetime(i.created),
+            "updated": _format_datetime(i.updated),
             "eo:cloud_cover": i.cloud_cover,
         }
 
         for key, value in i.assets.items():
-            value["href"] = BDC_STAC_FILE_ROOT + value["href"] + assets_kwargs
+            value["href"] = f"{BDC_STAC_FILE_ROOT}{value['href']}{assets_kwargs}"
 
-            for band in bands["eo:bands"]:
-                if band["name"] == key:
-                    value["eo:bands"] = [band]
+            band = band_index.get(key)
+            if band is not None:
+                value["eo:bands"] = [band]
 
         if i.meta:
-            if "platform" in i.meta:
-                properties["instruments"] = i.meta["platform"]["instruments"]
-                properties["platform"] = i.meta["platform"]["code"]
-
-                i.meta.pop("platform")  # platform info is displayed on properties
+            platform = i.meta.get("platform")
+            if platform is not None:
+                properties["instruments"] = platform["instruments"]
+                properties["platform"] = platform["code"]
 
         if i.item_meta:
             properties["bdc:metadata"] = i.item_meta
@@ -591,8 +873,29 @@ def make_geojson(items, assets_kwargs=""):
         feature["properties"] = properties
         feature["assets"] = i.assets
 
-        features.append(feature)
-    return features
+        yield feature
+
+
+def parse_bbox(bbox):
+    """Parse and validate a bounding box.
+
+    :param bbox: bounding box as a list or a comma separated string [west, south, east, north]
+    :type bbox: list or str
+    :raises InvalidBoundingBoxError: if the bbox does not have four numbers or does not cover an area
+    :return: bounding box coordinates
+    :rtype: list
+    """
+    values = bbox.split(",") if isinstance(bbox, str) else bbox
+
+    try:
+        values = [float(x) for x in values]
+    except (TypeError, ValueError):
+        raise InvalidBoundingBoxError(f"'{bbox}' is not a valid bbox.")
+
+    if len(values) != 4 or values[0] == values[2] or values[1] == values[3]:
+        raise InvalidBoundingBoxError(f"'{bbox}' is not a valid bbox.")
+
+    return values
 
 
 def create_query_filter(query):
@@ -186,14 +186,14 @@ def collection_items(collection_id, roles=None):
     """
     items = get_collection_items(collection_id=collection_id, roles=roles, **request.args)
 
-    features = make_geojson(items.items, assets_kwargs=request.assets_kwargs)
+    features = list(make_geojson(items.items, assets_kwargs=request.assets_kwargs))
 
     item_collection = {
         "stac_version": BDC_STAC_API_VERSION,
         "stac_extensions": ["checksum", "commons", "context", "eo"],
         "type": "FeatureCollection",
         "links": [],
-        "context": {"matched": items.total, "returned": len(items.items), "limit": items.per_page},
+        "context": {"matched": items.total, "returned": len(features), "limit": items.per_page},
         "features": features,
     }
 
@@ -227,14 +227,14 @@ def items_id(collection_id, item_id, roles=None):
     :param collection_id: identifier (name) of a specific collection
     :param item_id: identifier (name) of a specific item
     """
-    item = get_collection_items(collection_id=collection_id, roles=roles, item_id=item_id)
+    items = get_collection_items(collection_id=collection_id, roles=roles, item_id=item_id)
 
-    if not item.total:
-        abort(404, f"Invalid item id '{item_id}' for collection '{collection_id}'")
+    features = list(make_geojson(items.items, assets_kwargs=request.assets_kwargs))
 
-    item = make_geojson(item.items, assets_kwargs=request.assets_kwargs)[0]
+    if not features:
+        abort(404, f"Invalid item id '{item_id}' for collection '{collection_id}'")
 
-    return item
+    return features[0]
 
 
 @current_app.route("/search", methods=["POST"])
@@ -248,14 +248,14 @@ def stac_search_post(roles=None):
     else:
         abort(400, "POST Request must be an application/json")
 
-    features = make_geojson(items.items, assets_kwargs=request.assets_kwargs)
+    features = list(make_geojson(items.items, assets_kwargs=request.assets_kwargs))
 
     response = {
         "type": "FeatureCollection",
         "links": [],
         "context": {
             "matched": items.total,
-            "returned": len(items.items),
+            "returned": len(features),
         },
         "features": features,
     }
@@ -291,14 +291,14 @@ def stac_search_get(roles=None):
     """Search STAC items with simple filtering."""
     items = get_collection_items(**request.args, roles=roles)
 
-    features = make_geojson(items.items, assets_kwargs=request.assets_kwargs)
+    features = list(make_geojson(items.items, assets_kwargs=request.assets_kwargs))
 
     response = {
         "type": "FeatureCollection",
         "links": [],
         "context": {
             "matched": items.total,
-            "returned": len(items.items),
+            "returned": len(features),
         },
         "features": features,
     }
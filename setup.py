@@ -48,6 +48,7 @@ setup_requires = [
 ]
 
 install_requires = [
+    "cachetools>=4.0",
     "Flask>=1.1.1",
     "flask-redoc>=0.2.0",
     "GeoAlchemy2>=0.6.3",